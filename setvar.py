@@ -10,18 +10,38 @@ import argparse
 import sys
 import os
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-import json
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
 import re
-from datetime import datetime
-import zipfile
-import shutil
 from enum import Enum
-import logging
+
+# json, zipfile, shutil, datetime and logging are imported where they are used, so
+# --help, --version and usage errors import none of them (get still needs logging)
 
 
 __version__ = "0.1.0"
 
+# Precompiled patterns used on every config file line
+_EXPORT_RE = re.compile(r'^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)=(.*)$')  # [export ]VAR=value
+_ASSIGN_RE = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*)=(.*)$')  # KEY=value (.env files)
+_VALID_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+_NEEDS_QUOTE_RE = re.compile(r'[ \t$`"\'\\!*?\[\](){}<>|&;]')  # shell metacharacters
+
+# Config files smaller than this are stored uncompressed in backups
+_BACKUP_STORE_THRESHOLD = 64 * 1024
+
+
+def _compile_patterns(patterns: Optional[Union[List[str], re.Pattern]]) -> Optional[re.Pattern]:
+    """Combine shell-style wildcard patterns into a single compiled regex
+    
+    Already compiled patterns are returned as-is; no patterns means no filter (None).
+    """
+    if not patterns:
+        return None
+    if isinstance(patterns, re.Pattern):
+        return patterns
+    import fnmatch
+    return re.compile('|'.join(f'(?:{fnmatch.translate(p)})' for p in patterns))
+
 
 class Shell(Enum):
     """Supported shell types"""
@@ -52,6 +72,17 @@ class Shell(Enum):
         return []
 
 
+_SHELL_BY_NAME = {s.value: s for s in Shell}
+_ALL_SHELLS = list(Shell)
+
+
+def _resolve_shells(shells: List) -> List[Shell]:
+    """Expand parsed --shell style arguments, where 'all' selects every shell"""
+    if 'all' in shells:
+        return list(_ALL_SHELLS)
+    return list(shells)
+
+
 class SetVar:
     """Main setvar application class"""
     
@@ -59,12 +90,20 @@ class SetVar:
                  backup_enabled: bool = True,
                  verbose: bool = False,
                  dry_run: bool = False):
+        import logging
+        
         self.config_dir = Path(config_dir or os.path.expanduser("~/.config/setvar"))
         self.backup_dir = self.config_dir / "backups"
         self.backup_enabled = backup_enabled
         self.verbose = verbose
         self.dry_run = dry_run
         
+        # Parsed variables per config file, keyed by path -> (mtime_ns, size, variables)
+        self._file_var_cache: Dict[str, Tuple[int, int, Dict[str, str]]] = {}
+        # Existing config files per shell, cleared whenever a config file is created or written
+        self._existing_cache: Dict[Shell, List[str]] = {}
+        self._all_config_files: Optional[List[str]] = None
+        
         # Set up logging
         log_level = logging.DEBUG if verbose else logging.INFO
         logging.basicConfig(
@@ -89,23 +128,22 @@ class SetVar:
         shell_env = os.environ.get('SHELL', '')
         self.log(f"Detected SHELL environment: {shell_env}")
         
-        if 'bash' in shell_env:
-            return Shell.BASH
-        elif 'zsh' in shell_env:
-            return Shell.ZSH
-        elif 'sh' in shell_env:
-            return Shell.SH
+        shell = _SHELL_BY_NAME.get(os.path.basename(shell_env))
+        if shell:
+            return shell
         
         # Try alternative detection methods
         try:
-            parent_process = os.popen('ps -p $$ -o comm=').read().strip()
+            # Read the parent's name from /proc where available to avoid spawning ps
+            ppid = os.getppid()
+            try:
+                with open(f'/proc/{ppid}/comm') as f:
+                    parent_process = f.read().strip()
+            except OSError:
+                parent_process = os.popen(f'ps -p {ppid} -o comm=').read().strip()
             self.log(f"Parent process: {parent_process}")
-            if 'bash' in parent_process:
-                return Shell.BASH
-            elif 'zsh' in parent_process:
-                return Shell.ZSH
-            elif 'sh' in parent_process:
-                return Shell.SH
+            # Login shells are reported with a leading dash (e.g. "-zsh")
+            return _SHELL_BY_NAME.get(os.path.basename(parent_process).lstrip('-'))
         except:
             pass
         
@@ -113,12 +151,40 @@ class SetVar:
     
     def find_existing_config_files(self, shell: Shell) -> List[str]:
         """Find which config files exist for a given shell"""
+        if shell in self._existing_cache:
+            return list(self._existing_cache[shell])
+        
         existing_files = []
         for config_file in shell.config_files:
             if Path(config_file).exists():
                 existing_files.append(config_file)
                 self.log(f"Found config file: {config_file}")
-        return existing_files
+        
+        self._existing_cache[shell] = existing_files
+        return list(existing_files)
+    
+    def find_all_config_files(self) -> List[str]:
+        """Find existing config files across all shells, each listed once"""
+        if self._all_config_files is None:
+            candidates = list(dict.fromkeys(f for shell in Shell for f in shell.config_files))
+            
+            # One directory listing per parent directory instead of a stat per candidate
+            names_by_dir: Dict[str, Set[str]] = {}
+            for candidate in candidates:
+                directory, name = os.path.split(candidate)
+                names_by_dir.setdefault(directory, set()).add(name)
+            
+            present = set()
+            for directory, names in names_by_dir.items():
+                try:
+                    with os.scandir(directory) as it:
+                        present.update(e.path for e in it if e.name in names and e.is_file())
+                except OSError as e:
+                    self.log(f"Error scanning {directory}: {e}", "warning")
+            
+            self._all_config_files = [f for f in candidates if f in present]
+        
+        return list(self._all_config_files)
     
     def get_primary_config_file(self, shell: Shell) -> str:
         """Get the primary config file for a shell (creates if needed)"""
@@ -130,11 +196,22 @@ class SetVar:
         primary = shell.config_files[0]
         if not self.dry_run:
             Path(primary).touch()
+            self._existing_cache.clear()
+            self._all_config_files = None
             self.log(f"Created new config file: {primary}")
         return primary
     
+    def _iter_lines(self, filepath: str) -> Iterator[str]:
+        """Stream lines from a shell configuration file (read errors propagate)"""
+        with open(filepath, 'r', buffering=65536) as f:
+            yield from f
+    
     def read_config_file(self, filepath: str) -> List[str]:
-        """Read a shell configuration file"""
+        """Read a shell configuration file
+        
+        A missing file reads as empty; any other read error is raised so that
+        callers about to rewrite the file never save a partial copy.
+        """
         try:
             with open(filepath, 'r') as f:
                 return f.readlines()
@@ -143,51 +220,73 @@ class SetVar:
             return []
         except Exception as e:
             self.log(f"Error reading {filepath}: {e}", "error")
-            return []
+            raise
     
     def write_config_file(self, filepath: str, lines: List[str]):
         """Write to a shell configuration file"""
+        import stat
+        import tempfile
+        
         if self.dry_run:
             self.log(f"[DRY RUN] Would write to {filepath}")
             return
         
+        # Write next to the real file (following symlinks) and swap it in atomically
+        target = os.path.realpath(filepath)
+        try:
+            mode = stat.S_IMODE(os.stat(target).st_mode)
+        except FileNotFoundError:
+            mode = 0o600
+        
+        # mkstemp creates a uniquely named file exclusively with mode 0600; the final
+        # mode is applied before any (possibly secret) content is written
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target),
+                                        prefix=f".{os.path.basename(target)}.", suffix=".tmp")
         try:
-            with open(filepath, 'w') as f:
+            with os.fdopen(fd, 'w') as f:
+                os.fchmod(f.fileno(), mode)
                 f.writelines(lines)
+                if not self.backup_enabled:
+                    # No backup to fall back on, so make sure the data hits the disk
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_path, target)
+            self._file_var_cache.pop(filepath, None)
+            self._existing_cache.clear()
+            self._all_config_files = None
             self.log(f"Updated {filepath}")
         except Exception as e:
             self.log(f"Error writing to {filepath}: {e}", "error")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
             raise
     
     def parse_export_line(self, line: str) -> Optional[Tuple[str, str]]:
         """Parse an export line to extract variable name and value"""
-        # Match various export formats
-        patterns = [
-            r'^\s*export\s+([A-Za-z_][A-Za-z0-9_]*)=(.*)$',  # export VAR=value
-            r'^\s*([A-Za-z_][A-Za-z0-9_]*)=(.*)$',  # VAR=value
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, line)
-            if match:
-                name = match.group(1)
-                value = match.group(2).strip()
-                
-                # Remove quotes if present
-                if (value.startswith('"') and value.endswith('"')) or \
-                   (value.startswith("'") and value.endswith("'")):
-                    value = value[1:-1]
-                
-                return (name, value)
+        # Cheap rejection of blank lines, comments and anything without an assignment
+        stripped = line.lstrip()
+        if not stripped or stripped[0] == '#' or '=' not in stripped:
+            return None
+        
+        # Match both "export VAR=value" and "VAR=value"
+        match = _EXPORT_RE.match(line)
+        if match:
+            name = match.group(1)
+            value = match.group(2).strip()
+            
+            # Remove quotes if present
+            if (value.startswith('"') and value.endswith('"')) or \
+               (value.startswith("'") and value.endswith("'")):
+                value = value[1:-1]
+            
+            return (name, value)
         
         return None
     
     def format_export_line(self, name: str, value: str) -> str:
         """Format a variable export line"""
         # Check if value needs quoting
-        needs_quotes = any(c in value for c in [' ', '\t', '$', '`', '"', "'", '\\', '!', '*', '?', '[', ']', '(', ')', '{', '}', '<', '>', '|', '&', ';'])
-        
-        if needs_quotes:
+        if _NEEDS_QUOTE_RE.search(value):
             # Escape double quotes in the value
             escaped_value = value.replace('"', '\\"')
             return f'export {name}="{escaped_value}"\n'
@@ -196,18 +295,57 @@ class SetVar:
     
     def get_variables_from_file(self, filepath: str) -> Dict[str, str]:
         """Extract all environment variables from a config file"""
-        variables = {}
-        lines = self.read_config_file(filepath)
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            st = None
         
-        for line in lines:
-            parsed = self.parse_export_line(line)
-            if parsed:
-                name, value = parsed
-                variables[name] = value
-                self.log(f"Found variable: {name}={value}")
+        if st is not None:
+            cached = self._file_var_cache.get(filepath)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                return dict(cached[2])
+        
+        parse = self.parse_export_line
+        try:
+            variables = {parsed[0]: parsed[1] for line in self._iter_lines(filepath)
+                         if (parsed := parse(line)) is not None}
+        except FileNotFoundError:
+            self.log(f"Config file not found: {filepath}", "warning")
+            return {}
+        except Exception as e:
+            # Unreadable files yield nothing rather than a partial (and uncached) result
+            self.log(f"Error reading {filepath}: {e}", "error")
+            return {}
+        
+        if self.verbose:
+            for name, value in variables.items():
+                self.logger.debug("Found variable: %s=%s", name, value)
+        
+        if st is not None:
+            self._file_var_cache[filepath] = (st.st_mtime_ns, st.st_size, dict(variables))
         
         return variables
     
+    def find_variable_in_file(self, filepath: str, name: str) -> Optional[str]:
+        """Look up a single variable in a config file without parsing every line"""
+        value = None
+        # Same reader and error handling as get_variables_from_file
+        try:
+            for line in self._iter_lines(filepath):
+                # Cheap substring check before running the regex
+                if name in line:
+                    parsed = self.parse_export_line(line)
+                    if parsed and parsed[0] == name:
+                        # Later assignments win, as in get_variables_from_file
+                        value = parsed[1]
+        except FileNotFoundError:
+            self.log(f"Config file not found: {filepath}", "warning")
+            return None
+        except Exception as e:
+            self.log(f"Error reading {filepath}: {e}", "error")
+            return None
+        return value
+    
     def get_all_variables(self, shells: List[Shell]) -> Dict[str, Dict[str, str]]:
         """Get all variables from specified shells"""
         all_vars = {}
@@ -224,6 +362,10 @@ class SetVar:
     
     def create_backup(self, files_to_backup: List[str], message: Optional[str] = None) -> Optional[str]:
         """Create a backup of specified files"""
+        import json
+        import zipfile
+        from datetime import datetime
+        
         if not self.backup_enabled or self.dry_run:
             if self.dry_run:
                 self.log("[DRY RUN] Would create backup")
@@ -234,11 +376,16 @@ class SetVar:
         backup_path = self.backup_dir / backup_name
         
         try:
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
                 for filepath in files_to_backup:
                     if Path(filepath).exists():
-                        zf.write(filepath, Path(filepath).name)
-                        self.log(f"Added {filepath} to backup")
+                        # Small rc files aren't worth compressing
+                        if os.path.getsize(filepath) < _BACKUP_STORE_THRESHOLD:
+                            zf.write(filepath, Path(filepath).name, compress_type=zipfile.ZIP_STORED)
+                        else:
+                            zf.write(filepath, Path(filepath).name)
+                        if self.verbose:
+                            self.logger.debug("Added %s to backup", filepath)
                 
                 # Add metadata
                 metadata = {
@@ -254,20 +401,36 @@ class SetVar:
             self.log(f"Failed to create backup: {e}", "error")
             return None
     
+    def _scan_backups(self) -> List[os.DirEntry]:
+        """Find backup archives in the backup directory, newest first"""
+        with os.scandir(self.backup_dir) as it:
+            entries = [e for e in it if e.name.startswith('backup_') and e.name.endswith('.zip')]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        return entries
+    
     def list_backups(self, limit: int = 10) -> List[Dict[str, any]]:
         """List available backups"""
+        import json
+        import zipfile
+        
         backups = []
         
         if not self.backup_dir.exists():
             return backups
         
-        backup_files = sorted(self.backup_dir.glob("backup_*.zip"), reverse=True)[:limit]
-        
-        for backup_file in backup_files:
+        # Newest first, so only the top `limit` archives need to be opened
+        for entry in self._scan_backups()[:limit]:
+            backup_file = Path(entry.path)
             try:
                 with zipfile.ZipFile(backup_file, 'r') as zf:
-                    if "metadata.json" in zf.namelist():
-                        metadata = json.loads(zf.read("metadata.json"))
+                    try:
+                        info = zf.getinfo("metadata.json")
+                    except KeyError:
+                        info = None
+                    
+                    if info is not None:
+                        with zf.open(info) as mf:
+                            metadata = json.load(mf)
                         backups.append({
                             "path": str(backup_file),
                             "name": backup_file.name,
@@ -291,6 +454,9 @@ class SetVar:
     
     def restore_backup(self, backup_id: str) -> bool:
         """Restore files from a backup"""
+        import shutil
+        import zipfile
+        
         if self.dry_run:
             self.log(f"[DRY RUN] Would restore backup {backup_id}")
             return True
@@ -301,35 +467,37 @@ class SetVar:
             backup_path = Path(backup_id)
         else:
             # Try to find by timestamp or filename
-            for backup_file in self.backup_dir.glob("backup_*.zip"):
-                if backup_id in str(backup_file):
-                    backup_path = backup_file
-                    break
+            if self.backup_dir.exists():
+                for entry in self._scan_backups():
+                    if backup_id in entry.path:
+                        backup_path = Path(entry.path)
+                        break
         
         if not backup_path:
             self.log(f"Backup not found: {backup_id}", "error")
             return False
         
         try:
-            # Create a restore backup first
-            files_to_backup = []
             with zipfile.ZipFile(backup_path, 'r') as zf:
+                # Create a restore backup first
+                files_to_backup = []
                 for filename in zf.namelist():
                     if filename != "metadata.json":
                         target_path = Path.home() / f".{filename}"
                         if target_path.exists():
                             files_to_backup.append(str(target_path))
-            
-            if files_to_backup:
-                self.create_backup(files_to_backup, f"Pre-restore backup (restoring from {backup_path.name})")
-            
-            # Perform the restore
-            with zipfile.ZipFile(backup_path, 'r') as zf:
-                for filename in zf.namelist():
-                    if filename != "metadata.json":
-                        content = zf.read(filename)
-                        target_path = Path.home() / f".{filename}"
-                        target_path.write_bytes(content)
+                
+                if files_to_backup:
+                    self.create_backup(files_to_backup, f"Pre-restore backup (restoring from {backup_path.name})")
+                
+                # Perform the restore
+                for info in zf.infolist():
+                    if info.filename != "metadata.json":
+                        target_path = Path.home() / f".{info.filename}"
+                        with zf.open(info) as src, open(target_path, 'wb') as dst:
+                            shutil.copyfileobj(src, dst, 1 << 16)
+                        self._existing_cache.clear()
+                        self._all_config_files = None
                         self.log(f"Restored {target_path}")
             
             self.log(f"Successfully restored from {backup_path.name}")
@@ -342,12 +510,13 @@ class SetVar:
                     skip_confirmation: bool = False, specific_file: Optional[str] = None) -> bool:
         """Set or update an environment variable across specified shells"""
         # Validate variable name
-        if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', name):
+        if not _VALID_NAME_RE.match(name):
             print(f"Error: Invalid variable name '{name}'. Must start with letter/underscore and contain only letters, numbers, and underscores.")
             return False
         
         # Collect files to modify and their current values
         files_to_modify = []
+        files_seen = set()
         current_values = {}
         
         if specific_file:
@@ -380,7 +549,8 @@ class SetVar:
                 
                 # If not found, use the primary config file
                 file_to_modify = found_in_file or config_files[0]
-                if file_to_modify not in files_to_modify:
+                if file_to_modify not in files_seen:
+                    files_seen.add(file_to_modify)
                     files_to_modify.append(file_to_modify)
         
         # Show what will be changed and get confirmation
@@ -424,33 +594,131 @@ class SetVar:
         if self.dry_run:
             return True
         
+        try:
+            try:
+                text = Path(filepath).read_text()
+            except FileNotFoundError:
+                text = ''
+            formatted_line = self.format_export_line(name, value).rstrip('\n')
+            
+            # Update existing variable in a single pass over the whole file
+            pattern = re.compile(rf'^[ \t]*(?:export[ \t]+)?{re.escape(name)}=.*$', re.MULTILINE)
+            new_text, count = pattern.subn(lambda _: formatted_line, text)
+            
+            # Add new variable if not found
+            if not count:
+                # Add newline if file doesn't end with one
+                if new_text and not new_text.endswith('\n'):
+                    new_text += '\n'
+                new_text += formatted_line + '\n'
+            
+            self.write_config_file(filepath, [new_text])
+            return True
+        except Exception as e:
+            self.log(f"Error updating {filepath}: {e}", "error")
+            return False
+    
+    def _plan_variable_files(self, updates: Dict[str, str],
+                             shells: List[Shell]) -> Dict[str, Dict[str, str]]:
+        """Group variable updates by the config file each one should be written to"""
+        plan: Dict[str, Dict[str, str]] = {}
+        if not updates:
+            return plan
+        
+        for shell in shells:
+            config_files = self.find_existing_config_files(shell)
+            if not config_files:
+                # Create primary config if none exist
+                config_files = [self.get_primary_config_file(shell)]
+            
+            vars_by_file = [(f, self.get_variables_from_file(f)) for f in config_files]
+            for name, value in updates.items():
+                # Update the file that already defines the variable, else the primary one
+                target = next((f for f, vars_in_file in vars_by_file if name in vars_in_file),
+                              config_files[0])
+                plan.setdefault(target, {})[name] = value
+        
+        return plan
+    
+    def _set_variables(self, plan: Dict[str, Dict[str, str]], message: str) -> Set[str]:
+        """Apply a file -> variables plan, returning the names of variables that failed"""
+        # One backup covering every file in the batch
+        if self.backup_enabled and not self.dry_run and plan:
+            self.create_backup(list(plan), message)
+        
+        # Export lines shared across files, so each (name, value) is formatted once
+        formatted_cache: Dict[Tuple[str, str], str] = {}
+        
+        failed: Set[str] = set()
+        for filepath, updates in plan.items():
+            failed_here = self._apply_variables(filepath, updates, formatted_cache)
+            if len(failed_here) < len(updates):
+                if self.dry_run:
+                    print(f"[DRY RUN] Would update {filepath}")
+                else:
+                    print(f"✓ Updated {filepath}")
+            for name in updates:
+                if name in failed_here:
+                    print(f"✗ Failed to update {name} in {filepath}")
+            failed.update(failed_here)
+        
+        return failed
+    
+    def _apply_variables(self, filepath: str, updates: Dict[str, str],
+                         formatted_cache: Optional[Dict[Tuple[str, str], str]] = None) -> Set[str]:
+        """Update or add several variables in a specific file with a single read and write
+        
+        Returns the names of the variables that could not be written.
+        """
+        if self.dry_run:
+            return set()
+        
+        if formatted_cache is None:
+            formatted_cache = {}
+        
+        # Format each variable on its own so a bad value only skips that variable
+        failed: Set[str] = set()
+        formatted = {}
+        for name, value in updates.items():
+            try:
+                key = (name, value)
+                if key not in formatted_cache:
+                    formatted_cache[key] = self.format_export_line(name, value)
+                formatted[name] = formatted_cache[key]
+            except Exception as e:
+                self.log(f"Error formatting {name} for {filepath}: {e}", "error")
+                failed.add(name)
+        
+        if not formatted:
+            return failed
+        
         try:
             lines = self.read_config_file(filepath)
             new_lines = []
-            variable_updated = False
-            formatted_line = self.format_export_line(name, value)
+            updated = set()
             
-            # Update existing variable
+            # Update existing variables
             for line in lines:
                 parsed = self.parse_export_line(line)
-                if parsed and parsed[0] == name:
-                    new_lines.append(formatted_line)
-                    variable_updated = True
+                if parsed and parsed[0] in formatted:
+                    new_lines.append(formatted[parsed[0]])
+                    updated.add(parsed[0])
                 else:
                     new_lines.append(line)
             
-            # Add new variable if not found
-            if not variable_updated:
+            # Add variables that were not found
+            missing = [line for name, line in formatted.items() if name not in updated]
+            if missing:
                 # Add newline if file doesn't end with one
                 if new_lines and not new_lines[-1].endswith('\n'):
                     new_lines.append('\n')
-                new_lines.append(formatted_line)
+                new_lines.extend(missing)
             
             self.write_config_file(filepath, new_lines)
-            return True
+            return failed
         except Exception as e:
             self.log(f"Error updating {filepath}: {e}", "error")
-            return False
+            return set(updates)
     
     def remove_variable(self, name: str, shells: List[Shell], 
                        skip_confirmation: bool = False) -> bool:
@@ -523,7 +791,7 @@ class SetVar:
             return False
     
     def sync_variables(self, from_shell: Shell, to_shells: List[Shell], 
-                      keys: Optional[List[str]] = None, skip_confirmation: bool = False) -> bool:
+                      keys: Optional[Union[List[str], re.Pattern]] = None, skip_confirmation: bool = False) -> bool:
         """Sync variables from one shell to others"""
         # Get variables from source shell
         source_vars = {}
@@ -536,15 +804,9 @@ class SetVar:
             return True
         
         # Filter by keys if provided
-        if keys:
-            import fnmatch
-            filtered_vars = {}
-            for var_name, var_value in source_vars.items():
-                for pattern in keys:
-                    if fnmatch.fnmatch(var_name, pattern):
-                        filtered_vars[var_name] = var_value
-                        break
-            source_vars = filtered_vars
+        matcher = _compile_patterns(keys)
+        if matcher:
+            source_vars = {name: value for name, value in source_vars.items() if matcher.match(name)}
         
         if not source_vars:
             print("No variables matched the specified patterns")
@@ -597,13 +859,15 @@ class SetVar:
                 print("Sync cancelled.")
                 return False
         
-        # Perform sync
-        success = True
+        # Perform sync, writing each target file once
+        file_plan: Dict[str, Dict[str, str]] = {}
         for to_shell, changes in sync_plan.items():
-            for var_name, change_info in changes.items():
-                if not self.set_variable(var_name, change_info['new_value'], 
-                                       [to_shell], skip_confirmation=True):
-                    success = False
+            updates = {name: info['new_value'] for name, info in changes.items()}
+            for filepath, file_updates in self._plan_variable_files(updates, [to_shell]).items():
+                file_plan.setdefault(filepath, {}).update(file_updates)
+        
+        failed = self._set_variables(file_plan, f"Before syncing from {from_shell.value}")
+        success = not failed
         
         if success:
             print(f"\n✓ Successfully synced {len(source_vars)} variable(s)")
@@ -611,8 +875,10 @@ class SetVar:
         return success
     
     def export_variables(self, output_path: str, format: str, shell: Optional[Shell] = None,
-                        keys: Optional[List[str]] = None) -> bool:
+                        keys: Optional[Union[List[str], re.Pattern]] = None) -> bool:
         """Export variables to a file"""
+        import json
+        
         # Determine which shell to export from
         if not shell:
             shell = self.detect_current_shell()
@@ -627,15 +893,9 @@ class SetVar:
             shell_vars.update(file_vars)
         
         # Filter by keys if provided
-        if keys:
-            import fnmatch
-            filtered_vars = {}
-            for var_name, var_value in shell_vars.items():
-                for pattern in keys:
-                    if fnmatch.fnmatch(var_name, pattern):
-                        filtered_vars[var_name] = var_value
-                        break
-            shell_vars = filtered_vars
+        matcher = _compile_patterns(keys)
+        if matcher:
+            shell_vars = {name: value for name, value in shell_vars.items() if matcher.match(name)}
         
         if not shell_vars:
             print("No variables found to export")
@@ -676,8 +936,10 @@ class SetVar:
             return False
     
     def import_variables(self, input_path: str, shells: List[Shell], 
-                        keys: Optional[List[str]] = None, skip_confirmation: bool = False) -> bool:
+                        keys: Optional[Union[List[str], re.Pattern]] = None, skip_confirmation: bool = False) -> bool:
         """Import variables from a file"""
+        import json
+        
         try:
             input_path = Path(input_path)
             
@@ -698,7 +960,7 @@ class SetVar:
                         line = line.strip()
                         if line and not line.startswith('#'):
                             # Parse KEY=value format
-                            match = re.match(r'^([A-Za-z_][A-Za-z0-9_]*)=(.*)$', line)
+                            match = _ASSIGN_RE.match(line)
                             if match:
                                 name = match.group(1)
                                 value = match.group(2)
@@ -721,15 +983,9 @@ class SetVar:
                 return True
             
             # Filter by keys if provided
-            if keys:
-                import fnmatch
-                filtered_vars = {}
-                for var_name, var_value in variables.items():
-                    for pattern in keys:
-                        if fnmatch.fnmatch(var_name, pattern):
-                            filtered_vars[var_name] = var_value
-                            break
-                variables = filtered_vars
+            matcher = _compile_patterns(keys)
+            if matcher:
+                variables = {name: value for name, value in variables.items() if matcher.match(name)}
             
             if not variables:
                 print("No variables matched the specified patterns")
@@ -748,15 +1004,23 @@ class SetVar:
                     print("Import cancelled.")
                     return False
             
-            # Import variables
+            # Import variables, writing each target file once
             success = True
-            imported_count = 0
+            valid_vars = {}
             for name, value in variables.items():
-                if self.set_variable(name, value, shells, skip_confirmation=True):
-                    imported_count += 1
+                if _VALID_NAME_RE.match(name):
+                    valid_vars[name] = value
                 else:
+                    print(f"Error: Invalid variable name '{name}'. Must start with letter/underscore and contain only letters, numbers, and underscores.")
                     success = False
             
+            file_plan = self._plan_variable_files(valid_vars, shells)
+            failed = self._set_variables(file_plan, f"Before importing from {input_path.name}")
+            if failed:
+                success = False
+            
+            imported_count = sum(1 for name in valid_vars if name not in failed)
+            
             print(f"\n✓ Imported {imported_count} variable(s)")
             return success
         
@@ -765,110 +1029,121 @@ class SetVar:
             return False
 
 
-def create_parser() -> argparse.ArgumentParser:
-    """Create and configure the argument parser"""
-    parser = argparse.ArgumentParser(
-        prog='setvar',
-        description='Manage environment variables across multiple shell configurations',
-        epilog='Examples:\n'
-               '  setvar set API_KEY "your-secret-key"\n'
-               '  setvar list --shell bash\n'
-               '  setvar sync --from bash --to zsh\n'
-               '  setvar export --keys "*_API_*" --output env.json',
-        formatter_class=argparse.RawDescriptionHelpFormatter
-    )
-    
-    # Global options
-    parser.add_argument('-V', '--version', action='version', 
-                      version=f'%(prog)s {__version__}',
-                      help='show version number and exit')
-    parser.add_argument('-v', '--verbose', action='store_true',
-                      help='enable verbose output')
-    parser.add_argument('-n', '--dry-run', action='store_true',
-                      help='show what would be done without making changes')
-    parser.add_argument('-y', '--yes', action='store_true',
-                      help='skip confirmation prompts')
-    parser.add_argument('--no-backup', action='store_true',
-                      help='disable automatic backups')
-    parser.add_argument('--config-dir', type=str,
-                      help='custom configuration directory (default: ~/.config/setvar)')
-    
-    # Subcommands
-    subparsers = parser.add_subparsers(dest='command', help='available commands')
-    
-    # set command
+# Shared, immutable argparse settings
+_SHELL_METAVAR = '{bash,zsh,sh}'
+_SHELL_OR_ALL_METAVAR = '{bash,zsh,sh,all}'
+_DEFAULT_ALL = ('all',)
+_EXPORT_FORMATS = ('json', 'env', 'shell')
+
+
+def _shell_arg(value: str) -> Shell:
+    """argparse type converting a shell name to a Shell member"""
+    shell = _SHELL_BY_NAME.get(value)
+    if shell is None:
+        choices = ', '.join(repr(name) for name in _SHELL_BY_NAME)
+        raise argparse.ArgumentTypeError(f"invalid choice: {value!r} (choose from {choices})")
+    return shell
+
+
+def _shell_or_all_arg(value: str):
+    """argparse type accepting a shell name or 'all'"""
+    if value == 'all':
+        return 'all'
+    try:
+        return _shell_arg(value)
+    except argparse.ArgumentTypeError:
+        choices = ', '.join(repr(name) for name in [*_SHELL_BY_NAME, 'all'])
+        raise argparse.ArgumentTypeError(f"invalid choice: {value!r} (choose from {choices})")
+
+
+def _build_set_parser(subparsers):
+    """Add the "set" subcommand parser"""
     set_parser = subparsers.add_parser('set', help='set or update an environment variable')
     set_parser.add_argument('name', help='variable name')
     set_parser.add_argument('value', help='variable value (use quotes for values with spaces)')
-    set_parser.add_argument('-s', '--shell', type=str, nargs='*',
-                          choices=['bash', 'zsh', 'sh', 'all'],
-                          default=['all'],
+    set_parser.add_argument('-s', '--shell', type=_shell_or_all_arg, nargs='*',
+                          metavar=_SHELL_OR_ALL_METAVAR,
+                          default=_DEFAULT_ALL,
                           help='target shell(s) (default: all)')
     set_parser.add_argument('-f', '--file', type=str,
                           help='specific config file to update')
-    
-    # get command
+
+
+def _build_get_parser(subparsers):
+    """Add the "get" subcommand parser"""
     get_parser = subparsers.add_parser('get', help='get value of an environment variable')
     get_parser.add_argument('name', help='variable name')
-    get_parser.add_argument('-s', '--shell', type=str,
-                          choices=['bash', 'zsh', 'sh'],
+    get_parser.add_argument('-s', '--shell', type=_shell_arg,
+                          metavar=_SHELL_METAVAR,
                           help='shell to check (default: current shell)')
-    
-    # list command
+
+
+def _build_list_parser(subparsers):
+    """Add the "list" subcommand parser"""
     list_parser = subparsers.add_parser('list', help='list environment variables')
-    list_parser.add_argument('-s', '--shell', type=str, nargs='*',
-                           choices=['bash', 'zsh', 'sh', 'all'],
-                           default=['all'],
+    list_parser.add_argument('-s', '--shell', type=_shell_or_all_arg, nargs='*',
+                           metavar=_SHELL_OR_ALL_METAVAR,
+                           default=_DEFAULT_ALL,
                            help='shell(s) to list from (default: all)')
     list_parser.add_argument('-p', '--pattern', type=str,
                            help='filter variables by pattern (supports wildcards)')
     list_parser.add_argument('--sync-check', action='store_true',
                            help='highlight variables that differ between shells')
-    
-    # remove command
+
+
+def _build_remove_parser(subparsers):
+    """Add the "remove" subcommand parser"""
     remove_parser = subparsers.add_parser('remove', help='remove an environment variable')
     remove_parser.add_argument('name', help='variable name')
-    remove_parser.add_argument('-s', '--shell', type=str, nargs='*',
-                             choices=['bash', 'zsh', 'sh', 'all'],
-                             default=['all'],
+    remove_parser.add_argument('-s', '--shell', type=_shell_or_all_arg, nargs='*',
+                             metavar=_SHELL_OR_ALL_METAVAR,
+                             default=_DEFAULT_ALL,
                              help='target shell(s) (default: all)')
-    
-    # sync command
+
+
+def _build_sync_parser(subparsers):
+    """Add the "sync" subcommand parser"""
     sync_parser = subparsers.add_parser('sync', help='synchronize variables between shells')
     sync_parser.add_argument('--from', dest='from_shell', required=True,
-                           choices=['bash', 'zsh', 'sh'],
+                           type=_shell_arg, metavar=_SHELL_METAVAR,
                            help='source shell')
     sync_parser.add_argument('--to', dest='to_shell', nargs='*',
-                           choices=['bash', 'zsh', 'sh', 'all'],
-                           default=['all'],
+                           type=_shell_or_all_arg, metavar=_SHELL_OR_ALL_METAVAR,
+                           default=_DEFAULT_ALL,
                            help='target shell(s) (default: all)')
     sync_parser.add_argument('-k', '--keys', type=str, nargs='*',
                            help='specific variable names or patterns to sync')
-    
-    # export command
+
+
+def _build_export_parser(subparsers):
+    """Add the "export" subcommand parser"""
     export_parser = subparsers.add_parser('export', help='export variables to file')
     export_parser.add_argument('-o', '--output', type=str, required=True,
                              help='output file path')
-    export_parser.add_argument('-f', '--format', choices=['json', 'env', 'shell'],
+    export_parser.add_argument('-f', '--format', choices=_EXPORT_FORMATS,
                              default='json',
                              help='export format (default: json)')
-    export_parser.add_argument('-s', '--shell', type=str,
-                             choices=['bash', 'zsh', 'sh'],
+    export_parser.add_argument('-s', '--shell', type=_shell_arg,
+                             metavar=_SHELL_METAVAR,
                              help='source shell (default: current shell)')
     export_parser.add_argument('-k', '--keys', type=str, nargs='*',
                              help='variable names or patterns to export (e.g., "*_API_*")')
-    
-    # import command
+
+
+def _build_import_parser(subparsers):
+    """Add the "import" subcommand parser"""
     import_parser = subparsers.add_parser('import', help='import variables from file')
     import_parser.add_argument('file', help='input file path')
-    import_parser.add_argument('-s', '--shell', type=str, nargs='*',
-                             choices=['bash', 'zsh', 'sh', 'all'],
-                             default=['all'],
+    import_parser.add_argument('-s', '--shell', type=_shell_or_all_arg, nargs='*',
+                             metavar=_SHELL_OR_ALL_METAVAR,
+                             default=_DEFAULT_ALL,
                              help='target shell(s) (default: all)')
     import_parser.add_argument('-k', '--keys', type=str, nargs='*',
                              help='specific variable names or patterns to import')
-    
-    # backup command
+
+
+def _build_backup_parser(subparsers):
+    """Add the "backup" subcommand parser and its create/list/restore subcommands"""
     backup_parser = subparsers.add_parser('backup', help='manage configuration backups')
     backup_subparsers = backup_parser.add_subparsers(dest='backup_command')
     
@@ -882,222 +1157,330 @@ def create_parser() -> argparse.ArgumentParser:
     
     backup_restore = backup_subparsers.add_parser('restore', help='restore from backup')
     backup_restore.add_argument('backup_id', help='backup ID or timestamp')
-    
-    return parser
 
 
-def main():
-    """Main entry point"""
-    parser = create_parser()
-    args = parser.parse_args()
+# Subcommand parser builders, in the order they are listed in --help
+_COMMAND_BUILDERS = {
+    'set': _build_set_parser,
+    'get': _build_get_parser,
+    'list': _build_list_parser,
+    'remove': _build_remove_parser,
+    'sync': _build_sync_parser,
+    'export': _build_export_parser,
+    'import': _build_import_parser,
+    'backup': _build_backup_parser,
+}
+
+
+def _find_command(argv: List[str]) -> Optional[str]:
+    """Find the subcommand named in argv, skipping global options"""
+    args = iter(argv)
+    for arg in args:
+        if arg in ('-h', '--help'):
+            return None
+        if arg == '--config-dir':
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg if arg in _COMMAND_BUILDERS else None
+    return None
+
+
+def create_parser(argv: Optional[List[str]] = None) -> argparse.ArgumentParser:
+    """Create and configure the argument parser
     
-    # Show help if no command provided
-    if not args.command:
-        parser.print_help()
-        sys.exit(0)
+    Only the subparser for the command named in argv is built; all of them
+    are built when no known command is given (e.g. for --help).
+    """
+    parser = argparse.ArgumentParser(
+        prog='setvar',
+        description='Manage environment variables across multiple shell configurations',
+        epilog='Examples:\n'
+               '  setvar set API_KEY "your-secret-key"\n'
+               '  setvar list --shell bash\n'
+               '  setvar sync --from bash --to zsh\n'
+               '  setvar export --keys "*_API_*" --output env.json',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
     
-    # Initialize SetVar with global options
-    app = SetVar(
+    # Global options
+    parser.add_argument('-V', '--version', action='version', 
+                      version=f'%(prog)s {__version__}',
+                      help='show version number and exit')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                      help='enable verbose output')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                      help='show what would be done without making changes')
+    parser.add_argument('-y', '--yes', action='store_true',
+                      help='skip confirmation prompts')
+    parser.add_argument('--no-backup', action='store_true',
+                      help='disable automatic backups')
+    parser.add_argument('--config-dir', type=str,
+                      help='custom configuration directory (default: ~/.config/setvar)')
+    
+    # Subcommands
+    subparsers = parser.add_subparsers(dest='command', help='available commands')
+    
+    command = _find_command(sys.argv[1:] if argv is None else argv)
+    if command:
+        _COMMAND_BUILDERS[command](subparsers)
+    else:
+        for build in _COMMAND_BUILDERS.values():
+            build(subparsers)
+    
+    return parser
+
+
+def _create_app(args: argparse.Namespace) -> SetVar:
+    """Construct SetVar from the global command-line options"""
+    return SetVar(
         config_dir=args.config_dir,
         backup_enabled=not args.no_backup,
         verbose=args.verbose,
         dry_run=args.dry_run
     )
+
+
+def _handle_set(args: argparse.Namespace) -> int:
+    """Run the set command"""
+    app = _create_app(args)
     
-    # Handle commands
-    if args.command == 'set':
-        # Parse shell arguments
-        if 'all' in args.shell:
-            shells = list(Shell)
-        else:
-            shells = [Shell(s) for s in args.shell]
-        
-        success = app.set_variable(
-            name=args.name,
-            value=args.value,
-            shells=shells,
-            skip_confirmation=args.yes,
-            specific_file=args.file
-        )
-        sys.exit(0 if success else 1)
+    shells = _resolve_shells(args.shell)
     
-    elif args.command == 'get':
-        # Determine which shell to check
-        shell = None
-        if args.shell:
-            shell = Shell(args.shell)
-        else:
-            shell = app.detect_current_shell()
-            if not shell:
-                print("Error: Could not detect current shell. Please specify with --shell")
-                sys.exit(1)
-        
-        # Find the variable
-        found = False
-        for config_file in app.find_existing_config_files(shell):
-            vars_in_file = app.get_variables_from_file(config_file)
-            if args.name in vars_in_file:
-                print(vars_in_file[args.name])
-                found = True
-                break
-        
-        if not found:
-            print(f"Variable '{args.name}' not found in {shell.value} configuration")
-            sys.exit(1)
-    
-    elif args.command == 'list':
-        # Parse shell arguments
-        if 'all' in args.shell:
-            shells = list(Shell)
-        else:
-            shells = [Shell(s) for s in args.shell]
-        
-        all_vars = app.get_all_variables(shells)
-        
-        # Apply pattern filter if provided
-        if args.pattern:
-            import fnmatch
-            filtered_vars = {}
-            for shell_name, shell_vars in all_vars.items():
-                filtered = {k: v for k, v in shell_vars.items() 
-                          if fnmatch.fnmatch(k, args.pattern)}
-                if filtered:
-                    filtered_vars[shell_name] = filtered
-            all_vars = filtered_vars
-        
-        # Display results
-        if not all_vars or not any(all_vars.values()):
-            print("No variables found")
-            sys.exit(0)
-        
-        if args.sync_check:
-            # Check for sync discrepancies
-            all_var_names = set()
-            for shell_vars in all_vars.values():
-                all_var_names.update(shell_vars.keys())
-            
-            print("Variable Sync Status:")
-            print("=" * 70)
-            
-            for var_name in sorted(all_var_names):
-                values_by_shell = {}
-                for shell_name, shell_vars in all_vars.items():
-                    if var_name in shell_vars:
-                        values_by_shell[shell_name] = shell_vars[var_name]
-                
-                # Check if all values are the same
-                unique_values = set(values_by_shell.values())
-                if len(unique_values) > 1:
-                    print(f"\n⚠️  {var_name} (OUT OF SYNC)")
-                    for shell_name, value in values_by_shell.items():
-                        print(f"  {shell_name:8} = {value}")
-                else:
-                    print(f"\n✓ {var_name}")
-                    for shell_name, value in values_by_shell.items():
-                        print(f"  {shell_name:8} = {value}")
+    success = app.set_variable(
+        name=args.name,
+        value=args.value,
+        shells=shells,
+        skip_confirmation=args.yes,
+        specific_file=args.file
+    )
+    return 0 if success else 1
+
+
+def _handle_get(args: argparse.Namespace) -> int:
+    """Run the get command"""
+    app = _create_app(args)
+    
+    # Determine which shell to check
+    shell = args.shell or app.detect_current_shell()
+    if not shell:
+        print("Error: Could not detect current shell. Please specify with --shell")
+        return 1
+    
+    # Find the variable
+    for config_file in app.find_existing_config_files(shell):
+        value = app.find_variable_in_file(config_file, args.name)
+        if value is not None:
+            print(value)
+            return 0
+    
+    print(f"Variable '{args.name}' not found in {shell.value} configuration")
+    return 1
+
+
+def _handle_list(args: argparse.Namespace) -> int:
+    """Run the list command"""
+    app = _create_app(args)
+    
+    shells = _resolve_shells(args.shell)
+    
+    all_vars = app.get_all_variables(shells)
+    
+    # Apply pattern filter if provided
+    if args.pattern:
+        matcher = _compile_patterns([args.pattern])
+        filtered_vars = {}
+        for shell_name, shell_vars in all_vars.items():
+            filtered = {k: v for k, v in shell_vars.items() if matcher.match(k)}
+            if filtered:
+                filtered_vars[shell_name] = filtered
+        all_vars = filtered_vars
+    
+    # Display results
+    if not all_vars or not any(all_vars.values()):
+        print("No variables found")
+        return 0
+    
+    if args.sync_check:
+        # Check for sync discrepancies, grouping values by variable in one pass
+        values_by_var: Dict[str, Dict[str, str]] = {}
+        for shell_name, shell_vars in all_vars.items():
+            for var_name, value in shell_vars.items():
+                values_by_var.setdefault(var_name, {})[shell_name] = value
+        
+        # Collect output and write it in one go
+        out = ["Variable Sync Status:\n", "=" * 70 + "\n"]
+        
+        for var_name, values_by_shell in sorted(values_by_var.items()):
+            # Check if all values are the same
+            unique_values = set(values_by_shell.values())
+            if len(unique_values) > 1:
+                out.append(f"\n⚠️  {var_name} (OUT OF SYNC)\n")
+            else:
+                out.append(f"\n✓ {var_name}\n")
+            for shell_name, value in values_by_shell.items():
+                out.append("  %-8s = %s\n" % (shell_name, value))
+    else:
+        # Regular list display
+        out = []
+        for shell_name, shell_vars in all_vars.items():
+            if shell_vars:
+                out.append(f"\n{shell_name.upper()} Variables:\n")
+                out.append("-" * 50 + "\n")
+                for name, value in sorted(shell_vars.items()):
+                    out.append(f"{name}={value}\n")
+    
+    sys.stdout.write(''.join(out))
+    return 0
+
+
+def _handle_remove(args: argparse.Namespace) -> int:
+    """Run the remove command"""
+    app = _create_app(args)
+    
+    shells = _resolve_shells(args.shell)
+    
+    success = app.remove_variable(
+        name=args.name,
+        shells=shells,
+        skip_confirmation=args.yes
+    )
+    return 0 if success else 1
+
+
+def _handle_sync(args: argparse.Namespace) -> int:
+    """Run the sync command"""
+    app = _create_app(args)
+    
+    from_shell = args.from_shell
+    
+    # Parse target shells
+    if 'all' in args.to_shell:
+        to_shells = [s for s in _ALL_SHELLS if s != from_shell]
+    else:
+        to_shells = _resolve_shells(args.to_shell)
+    
+    success = app.sync_variables(
+        from_shell=from_shell,
+        to_shells=to_shells,
+        keys=_compile_patterns(args.keys),
+        skip_confirmation=args.yes
+    )
+    return 0 if success else 1
+
+
+def _handle_export(args: argparse.Namespace) -> int:
+    """Run the export command"""
+    app = _create_app(args)
+    
+    shell = args.shell
+    
+    success = app.export_variables(
+        output_path=args.output,
+        format=args.format,
+        shell=shell,
+        keys=_compile_patterns(args.keys)
+    )
+    return 0 if success else 1
+
+
+def _handle_import(args: argparse.Namespace) -> int:
+    """Run the import command"""
+    app = _create_app(args)
+    
+    shells = _resolve_shells(args.shell)
+    
+    success = app.import_variables(
+        input_path=args.file,
+        shells=shells,
+        keys=_compile_patterns(args.keys),
+        skip_confirmation=args.yes
+    )
+    return 0 if success else 1
+
+
+def _handle_backup(args: argparse.Namespace) -> int:
+    """Run the backup create, list or restore command"""
+    if not args.backup_command:
+        return 0
+    
+    app = _create_app(args)
+    
+    if args.backup_command == 'create':
+        # Get all shell config files for backup
+        all_files = app.find_all_config_files()
+        
+        if all_files:
+            backup_path = app.create_backup(all_files, args.message)
+            if backup_path:
+                print(f"Backup created: {backup_path}")
+            else:
+                print("Failed to create backup")
+                return 1
         else:
-            # Regular list display
-            for shell_name, shell_vars in all_vars.items():
-                if shell_vars:
-                    print(f"\n{shell_name.upper()} Variables:")
-                    print("-" * 50)
-                    for name, value in sorted(shell_vars.items()):
-                        print(f"{name}={value}")
+            print("No configuration files found to backup")
     
-    elif args.command == 'remove':
-        # Parse shell arguments
-        if 'all' in args.shell:
-            shells = list(Shell)
+    elif args.backup_command == 'list':
+        backups = app.list_backups(args.limit)
+        if not backups:
+            print("No backups found")
         else:
-            shells = [Shell(s) for s in args.shell]
-        
-        success = app.remove_variable(
-            name=args.name,
-            shells=shells,
-            skip_confirmation=args.yes
-        )
-        sys.exit(0 if success else 1)
+            out = [f"\nAvailable backups (showing last {args.limit}):\n", "=" * 70 + "\n"]
+            for backup in backups:
+                out.append(f"\nBackup: {backup['name']}\n")
+                out.append(f"  Time: {backup['timestamp']}\n")
+                out.append(f"  Message: {backup['message']}\n")
+                out.append(f"  Files: {', '.join(os.path.basename(f) for f in backup['files'])}\n")
+            sys.stdout.write(''.join(out))
     
-    elif args.command == 'sync':
-        from_shell = Shell(args.from_shell)
-        
-        # Parse target shells
-        if 'all' in args.to_shell:
-            to_shells = [s for s in Shell if s != from_shell]
+    elif args.backup_command == 'restore':
+        if app.restore_backup(args.backup_id):
+            print("Backup restored successfully")
         else:
-            to_shells = [Shell(s) for s in args.to_shell]
-        
-        success = app.sync_variables(
-            from_shell=from_shell,
-            to_shells=to_shells,
-            keys=args.keys,
-            skip_confirmation=args.yes
-        )
-        sys.exit(0 if success else 1)
+            print("Failed to restore backup")
+            return 1
     
-    elif args.command == 'export':
-        shell = Shell(args.shell) if args.shell else None
-        
-        success = app.export_variables(
-            output_path=args.output,
-            format=args.format,
-            shell=shell,
-            keys=args.keys
-        )
-        sys.exit(0 if success else 1)
+    return 0
+
+
+# Command name -> handler returning the process exit code
+HANDLERS = {
+    'set': _handle_set,
+    'get': _handle_get,
+    'list': _handle_list,
+    'remove': _handle_remove,
+    'sync': _handle_sync,
+    'export': _handle_export,
+    'import': _handle_import,
+    'backup': _handle_backup,
+}
+
+
+def _fast_get(name: str) -> int:
+    """Handle a bare "setvar get NAME" without building the argument parser"""
+    args = argparse.Namespace(command='get', name=name, shell=None, config_dir=None,
+                              no_backup=False, verbose=False, dry_run=False)
+    return _handle_get(args)
+
+
+def main() -> int:
+    """Main entry point, returning the process exit code"""
+    argv = sys.argv[1:]
     
-    elif args.command == 'import':
-        # Parse shell arguments
-        if 'all' in args.shell:
-            shells = list(Shell)
-        else:
-            shells = [Shell(s) for s in args.shell]
-        
-        success = app.import_variables(
-            input_path=args.file,
-            shells=shells,
-            keys=args.keys,
-            skip_confirmation=args.yes
-        )
-        sys.exit(0 if success else 1)
-    
-    elif args.command == 'backup':
-        if args.backup_command == 'create':
-            # Get all shell config files for backup
-            all_files = []
-            for shell in Shell:
-                all_files.extend(app.find_existing_config_files(shell))
-            
-            if all_files:
-                backup_path = app.create_backup(all_files, args.message)
-                if backup_path:
-                    print(f"Backup created: {backup_path}")
-                else:
-                    print("Failed to create backup")
-                    sys.exit(1)
-            else:
-                print("No configuration files found to backup")
-        
-        elif args.backup_command == 'list':
-            backups = app.list_backups(args.limit)
-            if not backups:
-                print("No backups found")
-            else:
-                print(f"\nAvailable backups (showing last {args.limit}):")
-                print("=" * 70)
-                for backup in backups:
-                    print(f"\nBackup: {backup['name']}")
-                    print(f"  Time: {backup['timestamp']}")
-                    print(f"  Message: {backup['message']}")
-                    print(f"  Files: {', '.join(Path(f).name for f in backup['files'])}")
-        
-        elif args.backup_command == 'restore':
-            if app.restore_backup(args.backup_id):
-                print("Backup restored successfully")
-            else:
-                print("Failed to restore backup")
-                sys.exit(1)
+    # "setvar get NAME" is often run from prompts and scripts; skip argparse for it
+    if len(argv) == 2 and argv[0] == 'get' and not argv[1].startswith('-'):
+        return _fast_get(argv[1])
+    
+    parser = create_parser(argv)
+    args = parser.parse_args(argv)
+    
+    # Show help if no command provided
+    if not args.command:
+        parser.print_help()
+        return 0
+    
+    # Handlers construct SetVar themselves, only once they know they need it
+    return HANDLERS[args.command](args)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    sys.exit(main())